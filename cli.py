@@ -3,12 +3,94 @@
 Интерфейс командной строки для парсера конфигурационного языка (Вариант 21)
 """
 
+import os
 import sys
+import codecs
 import json
+import mmap
 import argparse
 from pathlib import Path
 from src.parser import ConfigParser, ParserError
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Файлы больше этого размера читаются через mmap
+MMAP_THRESHOLD = 1 << 20
+# Размер буфера при записи результата в файл
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Парсер создается один раз и переиспользуется между вызовами main()
+config_parser = ConfigParser()
+
+
+def write_json(result, f, stream: bool = True):
+    """Запись результата в текстовый поток f в виде JSON с отступом 2
+    
+    При наличии orjson документ целиком сериализуется им в bytes и
+    записывается в двоичный буфер потока без декодирования в str (только
+    для потоков в UTF-8). Иначе, а также для значений, которые orjson не
+    поддерживает (целые больше 64 бит или слишком глубокая вложенность),
+    используется json: при stream=True json.dump пишет документ по частям,
+    при stream=False документ сначала строится целиком, чтобы ошибка
+    кодирования не оставила в f половину вывода.
+    """
+    buffer = getattr(f, 'buffer', None)
+    if (orjson is not None and buffer is not None
+            and codecs.lookup(f.encoding).name == 'utf-8'):
+        try:
+            data = orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            # Уже записанный в текстовый слой вывод должен идти раньше
+            f.flush()
+            buffer.write(data)
+            return
+    if stream:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+    else:
+        f.write(json.dumps(result, indent=2, ensure_ascii=False) + '\n')
+
+
+def write_json_file(result, path: Path):
+    """Запись результата в файл path целиком или никак
+    
+    JSON пишется во временный файл рядом с path и переименовывается в path
+    только после успешной записи, поэтому ошибка кодирования (например,
+    RecursionError на очень глубокой вложенности) не оставляет на диске
+    обрезанный файл и не портит уже существующий.
+    """
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'x', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+            write_json(result, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def read_text(path: Path) -> str:
+    """Чтение файла целиком с однократным декодированием UTF-8
+    
+    Большие файлы декодируются прямо из отображения в память, без
+    промежуточной копии в bytes.
+    """
+    with open(path, 'rb') as f:
+        # Размер берется у уже открытого файла, а не по пути
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            return f.read().decode('utf-8')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, 'utf-8')
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -55,25 +137,20 @@ def main():
             print(f"Ошибка: файл '{args.input_file}' не найден", file=sys.stderr)
             return 1
         
-        with open(input_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        content = read_text(input_path)
         
         # Парсинг
-        config_parser = ConfigParser()
         result = config_parser.parse(content)
         
-        # Преобразование в JSON
-        json_output = json.dumps(result, indent=2, ensure_ascii=False)
-        
-        # Вывод
+        # Вывод JSON
         if args.output:
             output_path = Path(args.output)
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(json_output + '\n')
+            write_json_file(result, output_path)
             print(f"Результат сохранен в: {output_path}", file=sys.stderr)
         else:
-            print(json_output)
+            # В stdout нельзя откатить запись, поэтому без потоковой записи
+            write_json(result, sys.stdout, stream=False)
         
         return 0
         
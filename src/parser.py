@@ -9,7 +9,33 @@
 """
 
 import re
-from typing import Dict, Any, List, Union, Optional
+from typing import Dict, Any, List, Tuple, Union, Optional
+
+
+# Лексема: (тип, текст, смещение в исходном тексте).
+# Для ключевого слова и знаков пунктуации тип совпадает с текстом.
+Token = Tuple[str, str, int]
+
+# Пробельные символы и закрытые многострочные комментарии |# ... #|.
+# Сопоставление должно быть атомарным: иначе при неудаче движок перебирает
+# разбиения длинной серии пробелов (экспоненциально) и дает комментарию
+# захватить текст за первым '#|'. Атомарные группы (?>...) есть только с
+# Python 3.11, поэтому используется переносимый прием: опережающая проверка
+# запоминает совпадение в группе, а обратная ссылка поглощает его целиком,
+# без возможности отката внутрь.
+_TRIVIA = re.compile(r'(?=(?P<TRIVIA>(?:[ \t\r\n]+|\|#[\s\S]*?#\|)*))(?P=TRIVIA)')
+
+_TOKEN_SPEC = [
+    ('BINARY', r'0[bB][01]*'),
+    ('NAME', r'[A-Z]+'),
+    ('OP', r'table|->|[()\[\]=,;.-]'),
+]
+# Единое регулярное выражение лексера: пропуск пробелов и комментариев
+# входит в сопоставление каждой лексемы, отдельных проходов для них нет
+_TOKEN = re.compile(
+    _TRIVIA.pattern
+    + '(?:' + '|'.join(f'(?P<{kind}>{pattern})' for kind, pattern in _TOKEN_SPEC) + ')'
+)
 
 
 class ParserError(Exception):
@@ -24,235 +50,310 @@ class ParserError(Exception):
 class ConfigParser:
     """Парсер конфигурационного языка"""
     
+    # Фиксированный набор полей: без __dict__ доступ к атрибутам дешевле
+    __slots__ = ('text', 'tokens', 'tpos', '_const_idx', '_const_vals',
+                 '_last_const_name', '_last_const_i')
+    
     def __init__(self):
         self.text = ""
-        self.pos = 0
-        self.line = 1
-        self.column = 1
-        self.constants: Dict[str, Any] = {}
+        self.tokens: List[Token] = []
+        self.tpos = 0
+        # Константы: имя -> индекс в _const_vals
+        self._const_idx: Dict[str, int] = {}
+        self._const_vals: List[Any] = []
+        # Последняя разрешенная ссылка: одна и та же константа часто
+        # упоминается несколько раз подряд
+        self._last_const_name: Optional[str] = None
+        self._last_const_i = 0
     
     def reset(self):
-        """Сброс состояния парсера"""
-        self.pos = 0
-        self.line = 1
-        self.column = 1
-        self.constants = {}
+        """Сброс состояния парсера
+        
+        Контейнеры констант очищаются на месте, чтобы повторно используемый
+        парсер не выделял их заново для каждого файла.
+        """
+        self.tokens = []
+        self.tpos = 0
+        self._const_idx.clear()
+        self._const_vals.clear()
+        self._last_const_name = None
+        self._last_const_i = 0
     
-    def error(self, message: str):
-        """Генерация ошибки с текущей позицией"""
-        raise ParserError(message, self.line, self.column)
+    @property
+    def constants(self) -> Dict[str, Any]:
+        """Объявленные константы (новый словарь при каждом обращении)"""
+        return dict(zip(self._const_idx, self._const_vals))
     
-    def peek(self, n: int = 1) -> str:
-        """Посмотреть на n символов вперед без перемещения"""
-        if self.pos + n <= len(self.text):
-            return self.text[self.pos:self.pos + n]
-        return ""
+    def tokenize(self):
+        """Разбиение текста на лексемы за один проход
+        
+        Лексер не генерирует ошибок: на первом нераспознанном фрагменте он
+        останавливается и добавляет завершающую лексему ERROR (или COMMENT
+        для незакрытого комментария), на которой споткнется парсер. Так
+        ошибки по-прежнему сообщаются только там, куда дошел разбор.
+        """
+        text = self.text
+        match = _TOKEN.match
+        tokens = []
+        pos = 0
+        
+        while True:
+            m = match(text, pos)
+            if m is None:
+                break
+            kind = m.lastgroup
+            value = m.group(kind)
+            pos = m.end()
+            tokens.append((value if kind == 'OP' else kind, value, pos - len(value)))
+        
+        pos = _TRIVIA.match(text, pos).end()
+        if pos == len(text):
+            tokens.append(('EOF', '', pos))
+        elif text.startswith('|#', pos):
+            tokens.append(('COMMENT', '', pos))
+        else:
+            tokens.append(('ERROR', '', pos))
+        
+        self.tokens = tokens
     
-    def consume(self, n: int = 1):
-        """Пропустить n символов"""
-        for _ in range(n):
-            if self.pos >= len(self.text):
-                return
-            if self.text[self.pos] == '\n':
-                self.line += 1
-                self.column = 1
-            else:
-                self.column += 1
-            self.pos += 1
+    def location(self, pos: int) -> Tuple[int, int]:
+        """Строка и столбец смещения pos
+        
+        Вычисляются только при ошибке, встроенными str.count/str.rfind,
+        поэтому успешный разбор не тратит время на учет переводов строк.
+        """
+        line = self.text.count('\n', 0, pos) + 1
+        line_start = self.text.rfind('\n', 0, pos) + 1
+        return line, pos - line_start + 1
     
-    def skip_whitespace_and_comments(self):
-        """Пропустить пробелы и комментарии"""
-        while self.pos < len(self.text):
-            # Пробельные символы
-            if self.text[self.pos] in ' \t\r':
-                self.consume()
-            # Новая строка
-            elif self.text[self.pos] == '\n':
-                self.consume()
-            # Многострочный комментарий
-            elif self.peek(2) == '|#':
-                self.consume(2)  # Пропускаем |#
-                while self.pos < len(self.text) - 1:
-                    if self.peek(2) == '#|':
-                        self.consume(2)  # Пропускаем #|
-                        break
-                    self.consume()
-                else:
-                    self.error("Незакрытый многострочный комментарий")
-            else:
-                break
+    def error(self, message: str, offset: int = 0):
+        """Генерация ошибки в позиции текущей лексемы (со сдвигом offset)"""
+        kind, _, pos = self.tokens[self.tpos]
+        # Незакрытый комментарий не подходит ни одному правилу грамматики,
+        # поэтому любая ошибка на нем сообщается как ошибка комментария
+        if kind == 'COMMENT':
+            message = "Незакрытый многострочный комментарий"
+        line, column = self.location(pos + offset)
+        raise ParserError(message, line, column)
     
     def parse_name(self) -> str:
         """Парсинг имени [A-Z]+"""
-        self.skip_whitespace_and_comments()
-        
-        start = self.pos
-        while self.pos < len(self.text) and self.text[self.pos].isupper():
-            self.consume()
-        
-        if self.pos == start:
+        kind, value, _ = self.tokens[self.tpos]
+        if kind != 'NAME':
             self.error("Ожидалось имя из заглавных букв (A-Z)")
         
-        return self.text[start:self.pos]
+        self.tpos += 1
+        return value
     
     def parse_binary_number(self) -> int:
         """Парсинг двоичного числа 0[bB][01]+"""
-        self.skip_whitespace_and_comments()
-        
-        # Проверяем начало числа
-        if self.peek(2).lower() != '0b':
+        kind, value, _ = self.tokens[self.tpos]
+        if kind != 'BINARY':
             self.error("Ожидалось двоичное число (начинается с 0b или 0B)")
         
-        self.consume(2)  # Пропускаем 0b или 0B
-        
-        # Собираем двоичные цифры
-        start = self.pos
-        while self.pos < len(self.text) and self.text[self.pos] in '01':
-            self.consume()
-        
-        if self.pos == start:
-            self.error("Отсутствуют двоичные цифры после 0b")
-        
-        binary_str = self.text[start:self.pos]
+        # int() с основанием 2 сам принимает префикс 0b/0B, а лексема
+        # без цифр (просто "0b") для него некорректна
         try:
-            return int(binary_str, 2)
+            number = int(value, 2)
         except ValueError:
-            self.error(f"Некорректное двоичное число: 0b{binary_str}")
+            self.error("Отсутствуют двоичные цифры после 0b", 2)
+        
+        self.tpos += 1
+        return number
     
     def parse_constant_reference(self) -> Any:
         """Парсинг ссылки на константу .(ИМЯ)."""
-        if not self.match('.'):
+        tokens = self.tokens
+        
+        if tokens[self.tpos][0] != '.':
             self.error("Ожидалось '.' для ссылки на константу")
+        self.tpos += 1
         
-        self.skip_whitespace_and_comments()
-        if not self.match('('):
+        if tokens[self.tpos][0] != '(':
             self.error("Ожидалось '(' после '.'")
+        self.tpos += 1
         
         name = self.parse_name()
         
-        self.skip_whitespace_and_comments()
-        if not self.match(')'):
+        if tokens[self.tpos][0] != ')':
             self.error("Ожидалось ')' после имени константы")
+        self.tpos += 1
         
-        self.skip_whitespace_and_comments()
-        if not self.match('.'):
+        if tokens[self.tpos][0] != '.':
             self.error("Ожидалось '.' после ')'")
         
-        if name not in self.constants:
-            self.error(f"Неопределенная константа: {name}")
+        # Имя проверяется до сдвига за '.', чтобы ошибка указывала на конец
+        # ссылки, а не на следующую за ней лексему
+        if name == self._last_const_name:
+            i = self._last_const_i
+        else:
+            i = self._const_idx.get(name)
+            if i is None:
+                self.error(f"Неопределенная константа: {name}", 1)
+            
+            # Индекс константы не меняется при переобъявлении, поэтому его
+            # можно запомнить без сброса
+            self._last_const_name = name
+            self._last_const_i = i
         
-        return self.constants[name]
+        self.tpos += 1
+        return self._const_vals[i]
     
-    def match(self, expected: str) -> bool:
-        """Проверяет, соответствует ли следующий текст ожидаемому"""
-        if self.peek(len(expected)) == expected:
-            self.consume(len(expected))
-            return True
-        return False
-    
-    def parse_value(self) -> Any:
-        """Парсинг значения (число, таблица или константа)"""
-        self.skip_whitespace_and_comments()
+    def parse_table_open(self):
+        """Парсинг начала таблицы: table(["""
+        tokens = self.tokens
         
-        # Ссылка на константу
-        if self.peek(2) == '.(':
-            return self.parse_constant_reference()
+        if tokens[self.tpos][0] != 'table':
+            self.error("Ожидалось 'table'")
+        self.tpos += 1
         
-        # Двоичное число
-        elif self.peek(2).lower() == '0b':
-            return self.parse_binary_number()
+        if tokens[self.tpos][0] != '(':
+            self.error("Ожидалось '(' после 'table'")
+        self.tpos += 1
         
-        # Таблица
-        elif self.peek(5) == 'table':
-            return self.parse_table()
+        if tokens[self.tpos][0] != '[':
+            self.error("Ожидалось '[' после 'table('")
+        self.tpos += 1
+    
+    def parse_table_key(self) -> str:
+        """Парсинг начала элемента таблицы: ИМЯ ="""
+        name = self.parse_name()
         
-        else:
-            self.error("Ожидалось значение (число, таблица или ссылка на константу)")
+        if self.tokens[self.tpos][0] != '=':
+            self.error(f"Ожидалось '=' после имени '{name}'")
+        self.tpos += 1
+        
+        return name
     
-    def parse_table(self) -> Dict[str, Any]:
-        """Парсинг таблицы table([...])"""
-        if not self.match('table'):
-            self.error("Ожидалось 'table'")
+    def parse_table_close(self):
+        """Парсинг конца таблицы: ])"""
+        tokens = self.tokens
         
-        self.skip_whitespace_and_comments()
-        if not self.match('('):
-            self.error("Ожидалось '(' после 'table'")
+        if tokens[self.tpos][0] != ']':
+            self.error("Ожидалась ',' между элементами таблицы")
+        self.tpos += 1
         
-        self.skip_whitespace_and_comments()
-        if not self.match('['):
-            self.error("Ожидалось '[' после 'table('")
+        if tokens[self.tpos][0] != ')':
+            self.error("Ожидалось ')' после ']'")
+        self.tpos += 1
+    
+    def parse_value(self) -> Any:
+        """Парсинг значения (число, таблица или константа)
         
-        result = {}
-        first = True
+        Вложенные таблицы разбираются без рекурсии: на стеке лежат
+        незаконченные таблицы вместе с именем элемента, значение которого
+        сейчас разбирается.
+        """
+        tokens = self.tokens
+        stack: List[Tuple[Dict[str, Any], str]] = []
         
         while True:
-            self.skip_whitespace_and_comments()
-            
-            # Проверка на закрывающую скобку
-            if self.peek() == ']':
-                self.consume()  # Пропускаем ']'
-                self.skip_whitespace_and_comments()
-                if self.match(')'):
-                    return result
-                else:
-                    self.error("Ожидалось ')' после ']'")
+            kind = tokens[self.tpos][0]
             
-            # Запятая между элементами (кроме первого)
-            if not first:
-                if not self.match(','):
-                    self.error("Ожидалась ',' между элементами таблицы")
-                self.skip_whitespace_and_comments()
+            # Таблица: открываем и переходим к значению первого элемента
+            if kind == 'table':
+                self.parse_table_open()
+                value = {}
+                if tokens[self.tpos][0] != ']':
+                    stack.append((value, self.parse_table_key()))
+                    continue
+                self.parse_table_close()
             
-            # Парсинг пары имя=значение
-            name = self.parse_name()
+            # Ссылка на константу
+            # ('.' и '(' должны стоять вплотную)
+            elif (kind == '.' and tokens[self.tpos + 1][0] == '('
+                    and tokens[self.tpos + 1][2] == tokens[self.tpos][2] + 1):
+                value = self.parse_constant_reference()
             
-            self.skip_whitespace_and_comments()
-            if not self.match('='):
-                self.error(f"Ожидалось '=' после имени '{name}'")
+            # Двоичное число
+            elif kind == 'BINARY':
+                value = self.parse_binary_number()
             
-            value = self.parse_value()
+            else:
+                self.error("Ожидалось значение (число, таблица или ссылка на константу)")
             
-            result[name] = value
-            first = False
+            # Значение готово: записываем его в открытые таблицы и закрываем
+            # те из них, что на этом заканчиваются
+            while stack:
+                table, name = stack[-1]
+                table[name] = value
+                
+                # Запятая: переходим к значению следующего элемента
+                if tokens[self.tpos][0] == ',':
+                    self.tpos += 1
+                    stack[-1] = (table, self.parse_table_key())
+                    break
+                
+                self.parse_table_close()
+                stack.pop()
+                value = table
+            else:
+                return value
+    
+    def parse_table(self) -> Dict[str, Any]:
+        """Парсинг таблицы table([...])"""
+        if self.tokens[self.tpos][0] != 'table':
+            self.error("Ожидалось 'table'")
+        
+        return self.parse_value()
     
     def parse_constant_declaration(self) -> None:
         """Парсинг объявления константы: значение -> ИМЯ"""
+        tokens = self.tokens
+        
         value = self.parse_value()
         
-        self.skip_whitespace_and_comments()
-        if not self.match('-'):
+        kind = tokens[self.tpos][0]
+        if kind != '->':
+            # Одиночный '-' без '>' вплотную за ним
+            if kind == '-':
+                self.error("Ожидалось '>' после '-'", 1)
             self.error("Ожидалось '-' в объявлении константы")
-        
-        if not self.match('>'):
-            self.error("Ожидалось '>' после '-'")
+        self.tpos += 1
         
         name = self.parse_name()
         
         # Необязательная точка с запятой
-        self.skip_whitespace_and_comments()
-        if self.peek() == ';':
-            self.consume()
+        if tokens[self.tpos][0] == ';':
+            self.tpos += 1
         
-        self.constants[name] = value
+        i = self._const_idx.get(name)
+        if i is None:
+            self._const_idx[name] = len(self._const_vals)
+            self._const_vals.append(value)
+        else:
+            self._const_vals[i] = value
     
-    def parse(self, text: str) -> Dict[str, Any]:
-        """Основной метод парсинга"""
+    def parse_declarations(self) -> Dict[str, Any]:
+        """Парсинг последовательности объявлений констант до конца текста"""
+        while self.tokens[self.tpos][0] != 'EOF':
+            self.parse_constant_declaration()
+        
+        return self.constants
+    
+    def prepare(self, text: str):
+        """Сброс состояния и разбиение нового текста на лексемы"""
         self.reset()
         self.text = text
-        
-        self.skip_whitespace_and_comments()
+        self.tokenize()
+    
+    def parse_table_only(self, text: str) -> Dict[str, Any]:
+        """Парсинг текста, состоящего из одной таблицы table([...])"""
+        self.prepare(text)
+        return self.parse_table()
+    
+    def parse_constants_only(self, text: str) -> Dict[str, Any]:
+        """Парсинг текста, состоящего только из объявлений констант"""
+        self.prepare(text)
+        return self.parse_declarations()
+    
+    def parse(self, text: str) -> Dict[str, Any]:
+        """Основной метод парсинга"""
+        self.prepare(text)
         
         # Если текст начинается с table, парсим таблицу
-        if self.peek(5) == 'table':
+        if self.tokens[0][0] == 'table':
             return self.parse_table()
         
         # Иначе парсим объявления констант
-        while self.pos < len(self.text):
-            self.skip_whitespace_and_comments()
-            
-            if self.pos >= len(self.text):
-                break
-            
-            self.parse_constant_declaration()
-        
-        return self.constants.copy()
\ No newline at end of file
+        return self.parse_declarations()
@@ -7,6 +7,12 @@ import unittest
 import json
 import tempfile
 import os
+import io
+import sys
+import types
+import importlib
+from unittest import mock
+import cli
 from src.parser import ConfigParser, ParserError
 
 
@@ -47,6 +53,9 @@ class TestConfigParser(unittest.TestCase):
         
         with self.assertRaises(ParserError):
             self.parser.parse("0b1 -> ABC123")
+        
+        with self.assertRaises(ParserError):
+            self.parser.parse("0b1 -> АБВ")
     
     def test_table_basic(self):
         """Тест простой таблицы"""
@@ -78,6 +87,15 @@ table([
         self.assertEqual(result["SERVER"]["PORT"], 160)
         self.assertEqual(result["CLIENT"]["TIMEOUT"], 15)
     
+    def test_deep_nesting(self):
+        """Тест глубокой вложенности (без переполнения стека)"""
+        depth = 5000
+        text = "table([A = " * depth + "0b1" + "])" * depth
+        result = self.parser.parse(text)
+        for _ in range(depth - 1):
+            result = result["A"]
+        self.assertEqual(result, {"A": 1})
+    
     def test_constants(self):
         """Тест объявления и использования констант"""
         text = """
@@ -94,6 +112,12 @@ table([
         self.assertEqual(result["ORIGINAL"], 10)
         self.assertEqual(result["COPY"], 10)
     
+    def test_constant_redeclaration(self):
+        """Тест переобъявления константы после ссылки на нее"""
+        text = "0b1 -> A .(A). -> B 0b11 -> A .(A). -> C"
+        result = self.parser.parse(text)
+        self.assertEqual(result, {"A": 3, "B": 1, "C": 3})
+    
     def test_comments(self):
         """Тест многострочных комментариев"""
         text = """
@@ -129,12 +153,75 @@ table([
             self.parser.parse(text)
         self.assertIn("двоичные цифры", str(ctx.exception))
     
+    def test_error_position(self):
+        """Тест позиции ошибки (строка и столбец)"""
+        text = "0b1 -> A\n|# комментарий\n#| 0b1 -> abc"
+        with self.assertRaises(ParserError) as ctx:
+            self.parser.parse(text)
+        self.assertEqual(ctx.exception.line, 3)
+        self.assertEqual(ctx.exception.column, 11)
+    
+    def test_error_position_undefined_constant(self):
+        """Тест позиции ошибки неопределенной константы (конец ссылки)"""
+        test_cases = [
+            (".(X).\n\n\n-> Y", 1, 6),
+            ("table([A = .(X).\n\n])", 1, 17),
+            (".(ABX).|# c #| -> Y", 1, 8),
+        ]
+        
+        for text, line, column in test_cases:
+            with self.subTest(input=text):
+                with self.assertRaises(ParserError) as ctx:
+                    self.parser.parse(text)
+                self.assertIn("Неопределенная константа", ctx.exception.message)
+                self.assertEqual((ctx.exception.line, ctx.exception.column), (line, column))
+    
+    def test_error_messages_match_grammar(self):
+        """Тест сообщений об ошибках рядом со ссылками и '->'"""
+        test_cases = [
+            # Закрывающая '.' ссылки не сливается со следующей '('
+            (".(X).( -> Y", "Неопределенная константа: X", 1, 6),
+            ("0b1 -> A .(A).(", "Ожидалось '-' в объявлении константы", 1, 15),
+            # '-' и '>' должны стоять вплотную
+            ("0b1 - > A", "Ожидалось '>' после '-'", 1, 6),
+            # '.' и '(' в начале ссылки тоже
+            ("0b1 -> A . (A). -> B", "Ожидалось значение (число, таблица или ссылка на константу)", 1, 10),
+        ]
+        
+        for text, message, line, column in test_cases:
+            with self.subTest(input=text):
+                with self.assertRaises(ParserError) as ctx:
+                    self.parser.parse(text)
+                self.assertEqual(ctx.exception.message, message)
+                self.assertEqual((ctx.exception.line, ctx.exception.column), (line, column))
+    
+    def test_error_undefined_constant_before_unclosed_comment(self):
+        """Тест: неопределенная константа сообщается раньше незакрытого комментария"""
+        with self.assertRaises(ParserError) as ctx:
+            self.parser.parse(".(X).|# -, Y")
+        self.assertIn("Неопределенная константа: X", str(ctx.exception))
+    
     def test_empty_table(self):
         """Тест пустой таблицы"""
         text = "table([])"
         result = self.parser.parse(text)
         self.assertEqual(result, {})
     
+    def test_parse_table_only(self):
+        """Тест разбора текста, содержащего только таблицу"""
+        text = "|# заголовок #| table([A = 0b1, B = table([C = 0b10])])"
+        result = self.parser.parse_table_only(text)
+        self.assertEqual(result, {"A": 1, "B": {"C": 2}})
+        
+        with self.assertRaises(ParserError):
+            self.parser.parse_table_only("0b1 -> A")
+    
+    def test_parse_constants_only(self):
+        """Тест разбора текста, содержащего только константы"""
+        text = "table([A = 0b1]) -> T; .(T). -> U"
+        result = self.parser.parse_constants_only(text)
+        self.assertEqual(result, {"T": {"A": 1}, "U": {"A": 1}})
+    
     def test_multiple_constants_with_semicolon(self):
         """Тест нескольких констант с точкой с запятой"""
         text = """
@@ -221,6 +308,167 @@ class TestCLI(unittest.TestCase):
         
         self.assertNotEqual(result.returncode, 0)
         self.assertIn("не найден", result.stderr)
+    
+    def test_cli_too_deep_output_leaves_no_file(self):
+        """Тест: ошибка кодирования JSON не оставляет частичный вывод"""
+        import subprocess
+        
+        # Разбирается без рекурсии, но кодировщик json (и Python-, и
+        # C-реализация) на такой глубине падает
+        depth = 100000
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, 'deep.conf')
+            with open(input_file, 'w', encoding='utf-8') as f:
+                f.write("table([A = " * depth + "0b1" + "])" * depth)
+            output_dir = os.path.join(temp_dir, 'out')
+            output_file = os.path.join(output_dir, 'out.json')
+            
+            result = subprocess.run(
+                ['python', 'cli.py', input_file, '-o', output_file],
+                capture_output=True,
+                text=True,
+                encoding='utf-8'
+            )
+            self.assertNotEqual(result.returncode, 0)
+            self.assertEqual(os.listdir(output_dir), [])
+            
+            result = subprocess.run(
+                ['python', 'cli.py', input_file],
+                capture_output=True,
+                text=True,
+                encoding='utf-8'
+            )
+            self.assertNotEqual(result.returncode, 0)
+            self.assertEqual(result.stdout, "")
+    
+    def test_cli_without_orjson_big_integer(self):
+        """Тест вывода целого больше 64 бит при отсутствии orjson"""
+        import subprocess
+        
+        big = "1" * 80
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.conf', delete=False) as f:
+            f.write(f"0b{big} -> BIG")
+            temp_file = f.name
+        
+        try:
+            # Запрещаем импорт orjson и запускаем main() из cli.py
+            code = (
+                "import sys; sys.modules['orjson'] = None; "
+                "sys.argv = ['cli.py', sys.argv[1]]; "
+                "import cli; sys.exit(cli.main())"
+            )
+            result = subprocess.run(
+                ['python', '-c', code, temp_file],
+                capture_output=True,
+                text=True,
+                encoding='utf-8'
+            )
+            
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(json.loads(result.stdout), {"BIG": int(big, 2)})
+            
+        finally:
+            os.unlink(temp_file)
+    
+    def test_read_text(self):
+        """Тест чтения файла обычным способом и через mmap"""
+        content = "|# Комментарий #|\r\n0b1 -> A\n"
+        with tempfile.NamedTemporaryFile(mode='wb', suffix='.conf', delete=False) as f:
+            f.write(content.encode('utf-8'))
+            temp_file = f.name
+        
+        try:
+            self.assertEqual(cli.read_text(cli.Path(temp_file)), content)
+            
+            # Порог 1 байт: файл читается через mmap
+            with mock.patch.object(cli, 'MMAP_THRESHOLD', 1):
+                self.assertEqual(cli.read_text(cli.Path(temp_file)), content)
+        finally:
+            os.unlink(temp_file)
+
+
+
+class TestWriteJsonOrjson(unittest.TestCase):
+    """Тесты вывода JSON через orjson (с подставным модулем orjson)"""
+    
+    # Узнаваемый вывод подставного orjson, отличный от вывода json
+    STUB_OUTPUT = b'{"STUB": 1}\n'
+    
+    def setUp(self):
+        stub = types.ModuleType('orjson')
+        stub.OPT_INDENT_2 = 1
+        stub.OPT_APPEND_NEWLINE = 2
+        stub.JSONEncodeError = type('JSONEncodeError', (TypeError,), {})
+        stub.calls = []
+        stub.fail = False
+        
+        def dumps(obj, option=0):
+            stub.calls.append((obj, option))
+            if stub.fail:
+                raise stub.JSONEncodeError("Integer exceeds 64-bit range")
+            return self.STUB_OUTPUT
+        
+        stub.dumps = dumps
+        self.stub = stub
+        
+        # cli.py импортирует orjson при загрузке, поэтому перезагружаем его
+        patcher = mock.patch.dict(sys.modules, {'orjson': stub})
+        patcher.start()
+        self.addCleanup(importlib.reload, cli)
+        self.addCleanup(patcher.stop)
+        importlib.reload(cli)
+    
+    def test_bytes_written_to_buffer(self):
+        """Тест: байты orjson попадают в двоичный буфер после текста"""
+        raw = io.BytesIO()
+        f = io.TextIOWrapper(raw, encoding='utf-8')
+        f.write("Результат: ")
+        cli.write_json({"A": 1}, f)
+        f.flush()
+        
+        self.assertEqual(raw.getvalue(), "Результат: ".encode('utf-8') + self.STUB_OUTPUT)
+        self.assertEqual(self.stub.calls, [({"A": 1}, 3)])
+    
+    def test_fallback_on_encode_error(self):
+        """Тест: при JSONEncodeError вывод совпадает с json"""
+        self.stub.fail = True
+        result = {"BIG": 2 ** 80, "T": {"Я": 1}}
+        expected = json.dumps(result, indent=2, ensure_ascii=False) + '\n'
+        
+        for stream in (True, False):
+            with self.subTest(stream=stream):
+                raw = io.BytesIO()
+                f = io.TextIOWrapper(raw, encoding='utf-8')
+                cli.write_json(result, f, stream=stream)
+                f.flush()
+                self.assertEqual(raw.getvalue().decode('utf-8'), expected)
+        
+        self.assertEqual(len(self.stub.calls), 2)
+    
+    def test_non_utf8_stream_uses_json(self):
+        """Тест: поток не в UTF-8 или без буфера не использует orjson"""
+        result = {"Я": 1}
+        expected = json.dumps(result, indent=2, ensure_ascii=False) + '\n'
+        
+        raw = io.BytesIO()
+        f = io.TextIOWrapper(raw, encoding='cp1251')
+        cli.write_json(result, f)
+        f.flush()
+        self.assertEqual(raw.getvalue().decode('cp1251'), expected)
+        
+        f = io.StringIO()
+        cli.write_json(result, f)
+        self.assertEqual(f.getvalue(), expected)
+        
+        self.assertEqual(self.stub.calls, [])
+    
+    def test_write_json_file(self):
+        """Тест записи файла через orjson"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_file = cli.Path(temp_dir) / 'out.json'
+            cli.write_json_file({"A": 1}, output_file)
+            self.assertEqual(output_file.read_bytes(), self.STUB_OUTPUT)
+            self.assertEqual(os.listdir(temp_dir), ['out.json'])
 
 
 if __name__ == "__main__":